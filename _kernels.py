@@ -0,0 +1,415 @@
+"""Compiled kernels for the Monte Carlo step, the wrappers in core_func are the public interface"""
+import numpy as np
+try:
+    from numba import njit, types
+    from numba.extending import overload
+except ImportError:
+    def njit(*args, **kwargs):
+        """Fallback when numba is not installed, the kernels then run as plain python"""
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+    def overload(func):
+        """Fallback when numba is not installed, the python function is used as is"""
+        return lambda impl: impl
+
+"""possible migration directions"""
+MOVES = np.array([(1,1),(1,0),(1,-1),(0,1),(0,-1),(-1,1),(-1,0),(-1,-1)])
+
+
+@njit(cache=True)
+def seed(value):
+    """Seed the random number generator used inside the kernels"""
+    np.random.seed(value)
+
+
+def height_limits(surface):
+    """The lowest and highest height that can be stored in [surface], for a float surface the
+    range in which the heights are exact integers. Also usable inside the kernels."""
+    if np.issubdtype(surface.dtype, np.integer):
+        info = np.iinfo(surface.dtype)
+        return float(info.min), float(info.max)
+    return -2.0**53, 2.0**53
+
+
+@overload(height_limits)
+def _height_limits(surface):
+    if isinstance(surface.dtype, types.Integer):
+        info = np.iinfo(surface.dtype.name)
+        low, high = float(info.min), float(info.max)
+    else:
+        low, high = -2.0**53, 2.0**53
+    return lambda surface: (low, high)
+
+
+def periodic_indices(dims):
+    """Lookup tables for the periodic boundary conditions, made once per simulation
+
+    Parameter
+    ---------
+    dims : Tulple or nd.array
+        The dimensions of the crystal surface
+
+    Return
+    ------
+    rows : nd.array
+        A 3 x dims[0] table where rows[d+1, i] is the row index of i+d for d in {-1, 0, 1}
+    cols : nd.array
+        A 3 x dims[1] table where cols[d+1, j] is the column index of j+d for d in {-1, 0, 1}
+    """
+    tables = []
+    for L in dims[:2]:
+        index = np.arange(L)
+        tables.append(np.stack((np.roll(index, 1), index, np.roll(index, -1))))
+    return tables[0], tables[1]
+
+
+@njit(cache=True, fastmath=True, nogil=True)
+def count_neighbours(surface, out, rows, cols):
+    """Write the number of neighbours of every surface atom into [out]. The four comparisons are
+    done in one pass over the surface.
+
+    Parameter
+    ---------
+    surface : nd.array
+        An N x N matrix representing the surface of a crystal
+    out : nd.array
+        An N x N matrix the number of neighbours is written to
+    rows, cols : nd.array
+        The periodic index tables from periodic_indices
+    """
+    for i in range(surface.shape[0]):
+        ip = rows[2,i]
+        im = rows[0,i]
+        for j in range(surface.shape[1]):
+            s = surface[i,j]
+            out[i,j] = (1 + int(s <= surface[ip,j]) + int(s <= surface[im,j])
+                        + int(s <= surface[i,cols[2,j]]) + int(s <= surface[i,cols[0,j]]))
+
+
+@njit(cache=True, fastmath=True, nogil=True)
+def count_dislocation_neighbours(surface, offsets, out, rows, cols):
+    """Write the number of neighbours of every surface atom of a surface with dislocations into
+    [out], the heights of the neighbours are shifted by the dislocation offsets
+
+    Parameter
+    ---------
+    surface : nd.array
+        An N x N matrix representing the surface of a crystal
+    offsets : nd.array
+        The 4 x N x N offsets from core_func.dislocation_offsets
+    out : nd.array
+        An N x N matrix the number of neighbours is written to
+    rows, cols : nd.array
+        The periodic index tables from periodic_indices
+    """
+    for i in range(surface.shape[0]):
+        ip = rows[2,i]
+        im = rows[0,i]
+        for j in range(surface.shape[1]):
+            s = surface[i,j]
+            out[i,j] = (1 + int(s <= surface[ip,j] + offsets[0,i,j])
+                        + int(s <= surface[im,j] + offsets[1,i,j])
+                        + int(s <= surface[i,cols[2,j]] + offsets[2,i,j])
+                        + int(s <= surface[i,cols[0,j]] + offsets[3,i,j]))
+
+
+@njit(cache=True, fastmath=True, nogil=True)
+def nearest_neighbours(surface, rows, cols):
+    """Identifying the number of neighbours of each surface atom using periodic boundary
+    conditions.
+
+    Parameter
+    ---------
+    surface : nd.array
+        An N x N matrix representing the surface of a crystal
+    rows, cols : nd.array
+        The periodic index tables from periodic_indices
+
+    Return
+    ------
+    neighbours : nd.array
+        An N x N integer matrix with the number of occupied neighbouring spaces
+    """
+    neighbours = np.empty(surface.shape, dtype=np.int64)
+    count_neighbours(surface, neighbours, rows, cols)
+    return neighbours
+
+
+@njit(cache=True, fastmath=True, nogil=True)
+def site_neighbours(surface, i, j, rows, cols):
+    """The number of neighbours of the single surface atom at (i, j)"""
+    s = surface[i,j]
+    n = 1
+    if s <= surface[rows[2,i],j]:
+        n += 1
+    if s <= surface[i,cols[2,j]]:
+        n += 1
+    if s <= surface[rows[0,i],j]:
+        n += 1
+    if s <= surface[i,cols[0,j]]:
+        n += 1
+    return n
+
+
+@njit(cache=True, fastmath=True, nogil=True)
+def build_sites(neigh):
+    """Group the atoms by their number of neighbours
+
+    Parameter
+    ---------
+    neigh : nd.array
+        The number of neighbours of every atom, as returned by nearest_neighbours
+
+    Return
+    ------
+    counts : nd.array
+        counts[n] is the number of atoms with n neighbours
+    sites : nd.array
+        sites[n, :counts[n]] are the flat indices of the atoms with n neighbours
+    position : nd.array
+        position[k] is where the atom with flat index k is stored in its row of [sites]
+    """
+    flat = neigh.ravel()
+    counts = np.zeros(6, np.int64)
+    sites = np.empty((6, flat.size), np.int64)
+    position = np.empty(flat.size, np.int64)
+    for k in range(flat.size):
+        n = flat[k]
+        sites[n,counts[n]] = k
+        position[k] = counts[n]
+        counts[n] += 1
+    return counts, sites, position
+
+
+@njit(cache=True, fastmath=True, nogil=True)
+def move_site(counts, sites, position, k, a, b):
+    """Move the atom with flat index k from the list of class a to class b"""
+    last = sites[a,counts[a]-1]
+    sites[a,position[k]] = last
+    position[last] = position[k]
+    counts[a] -= 1
+
+    sites[b,counts[b]] = k
+    position[k] = counts[b]
+    counts[b] += 1
+
+
+@njit(cache=True, fastmath=True, nogil=True)
+def update_neighbours(neigh, counts, sites, position, surface, i, j, rows, cols):
+    """Recount the neighbours of (i, j) and the four atoms around it after the height at (i, j)
+    changed, [neigh] and the site lists are patched in place"""
+    L = surface.shape[1]
+    for d in range(5):
+        if d == 0:
+            x, y = i, j
+        elif d == 1:
+            x, y = rows[2,i], j
+        elif d == 2:
+            x, y = rows[0,i], j
+        elif d == 3:
+            x, y = i, cols[2,j]
+        else:
+            x, y = i, cols[0,j]
+        n = site_neighbours(surface, x, y, rows, cols)
+        if n != neigh[x,y]:
+            move_site(counts, sites, position, x*L + y, neigh[x,y], n)
+            neigh[x,y] = n
+
+
+@njit(cache=True, fastmath=True, nogil=True)
+def subset_from_counts(counts, k_minus, k_plus, k_nm):
+    """Draw a subset from the histogram [counts], where counts[n] is the number of atoms with
+    n neighbours. Searching on the right side never picks an empty subset and the index is
+    capped in case rounding puts the draw on the last edge of the cdf."""
+    cdf = np.cumsum(counts[1:6]*(k_minus + k_plus + np.diag(k_nm)))
+    index = np.searchsorted(cdf, np.random.random()*cdf[-1], side='right')
+    subset = min(index, 4) + 1
+    return subset
+
+
+@njit(cache=True, fastmath=True, nogil=True)
+def choose_subset(neigh, k_minus, k_plus, k_nm):
+    """Choose the number of neighbours of the subset in which the interaction will occur
+
+    Parameter
+    ---------
+    neigh : nd.array
+        The number of neighbours of every atom, as returned by nearest_neighbours
+    k_minus, k_plus, k_nm : nd.array, float, nd.array
+        The rate tables from core_func.build_rate_tables
+
+    Return
+    ------
+    subset : int
+        The number of neighbours all the atoms in the subset have
+    """
+    counts = np.bincount(neigh.ravel(), minlength=6)
+    return subset_from_counts(counts, k_minus, k_plus, k_nm)
+
+
+@njit(cache=True, fastmath=True, nogil=True)
+def step(surface, neigh, counts, sites, position, k_minus, k_plus, k_nm, rows, cols):
+    """Randomly lets an interaction take place in the chosen subset. The state [surface], [neigh]
+    and the site lists from build_sites are changed in place, only the atoms around the changed
+    sites are recounted."""
+    subset = subset_from_counts(counts, k_minus, k_plus, k_nm)
+    site = sites[subset,np.random.randint(counts[subset])]
+
+    x = site // surface.shape[1]
+    y = site % surface.shape[1]
+
+    k_n = k_minus[subset-1]
+    denom = k_plus + k_n + k_nm[subset-1,subset-1]
+
+    rand = np.random.random()
+    if rand < k_plus/denom:
+        surface[x,y] += 1
+        update_neighbours(neigh, counts, sites, position, surface, x, y, rows, cols)
+    elif rand < (k_plus+k_n)/denom:
+        surface[x,y] -= 1
+        update_neighbours(neigh, counts, sites, position, surface, x, y, rows, cols)
+    else:
+        move = np.random.randint(8)
+        x_m = rows[MOVES[move,0]+1,x]
+        y_m = cols[MOVES[move,1]+1,y]
+        m = neigh[x_m,y_m]
+        n = neigh[x,y]
+        if np.random.random() < k_nm[n-1,m-1]:
+            surface[x,y] -= 1
+            surface[x_m,y_m] += 1
+            update_neighbours(neigh, counts, sites, position, surface, x, y, rows, cols)
+            update_neighbours(neigh, counts, sites, position, surface, x_m, y_m, rows, cols)
+
+
+@njit(cache=True, fastmath=True, nogil=True)
+def interaction(surface, k_minus, k_plus, k_nm, rows, cols):
+    """Randomly lets an interaction take place in the chosen subset, [surface] is changed in place"""
+    neigh = nearest_neighbours(surface, rows, cols)
+    counts, sites, position = build_sites(neigh)
+    step(surface, neigh, counts, sites, position, k_minus, k_plus, k_nm, rows, cols)
+    return surface
+
+
+@njit(cache=True, fastmath=True, nogil=True)
+def periodic_distance(x_a, y_a, x_b, y_b, dims):
+    """The number of nearest neighbour hops between (x_a, y_a) and (x_b, y_b) on the periodic
+    surface"""
+    dx = abs(x_a - x_b)
+    dy = abs(y_a - y_b)
+    return min(dx, dims[0] - dx) + min(dy, dims[1] - dy)
+
+
+@njit(cache=True, fastmath=True, nogil=True)
+def interaction_batch(surface, neigh, counts, sites, position, K, k_minus, k_plus, k_nm,
+                      rows, cols):
+    """Draw K interactions at once from the current state and apply the ones that do not
+    conflict. All subsets, sites and outcomes are drawn from the state at the start of the batch.
+    An interaction is dropped when its site or migration target lies within a distance of 2 of an
+    atom changed earlier in the batch. This is an approximation of doing the interactions one by
+    one: the subset and site probabilities are not updated within the batch and dropping
+    conflicting interactions biases the draw, the error grows with K/L^2.
+
+    Return
+    ------
+    applied : int
+        The number of interactions in the batch that were not dropped
+    """
+    dims = surface.shape
+    rand = np.random.random((K, 2))
+    kind = np.empty(K, np.int64)
+    loc = np.empty((K, 4), np.int64)
+    for k in range(K):
+        subset = subset_from_counts(counts, k_minus, k_plus, k_nm)
+        site = sites[subset,np.random.randint(counts[subset])]
+        x = site // dims[1]
+        y = site % dims[1]
+        loc[k,0] = x
+        loc[k,1] = y
+        loc[k,2] = x
+        loc[k,3] = y
+
+        k_n = k_minus[subset-1]
+        denom = k_plus + k_n + k_nm[subset-1,subset-1]
+        if rand[k,0] < k_plus/denom:
+            kind[k] = 0
+        elif rand[k,0] < (k_plus+k_n)/denom:
+            kind[k] = 1
+        else:
+            move = np.random.randint(8)
+            x_m = rows[MOVES[move,0]+1,x]
+            y_m = cols[MOVES[move,1]+1,y]
+            loc[k,2] = x_m
+            loc[k,3] = y_m
+            if rand[k,1] < k_nm[neigh[x,y]-1,neigh[x_m,y_m]-1]:
+                kind[k] = 2
+            else:
+                kind[k] = 3
+
+    changed = np.empty((2*K, 2), np.int64)
+    n_changed = 0
+    applied = 0
+    for k in range(K):
+        conflict = False
+        for c in range(n_changed):
+            if (periodic_distance(loc[k,0], loc[k,1], changed[c,0], changed[c,1], dims) <= 2
+                    or periodic_distance(loc[k,2], loc[k,3], changed[c,0], changed[c,1], dims) <= 2):
+                conflict = True
+                break
+        if conflict:
+            continue
+        applied += 1
+
+        x, y, x_m, y_m = loc[k,0], loc[k,1], loc[k,2], loc[k,3]
+        if kind[k] == 0:
+            surface[x,y] += 1
+        elif kind[k] == 1:
+            surface[x,y] -= 1
+        elif kind[k] == 2:
+            surface[x,y] -= 1
+            surface[x_m,y_m] += 1
+        else:
+            continue
+
+        update_neighbours(neigh, counts, sites, position, surface, x, y, rows, cols)
+        changed[n_changed,0] = x
+        changed[n_changed,1] = y
+        n_changed += 1
+        if kind[k] == 2:
+            update_neighbours(neigh, counts, sites, position, surface, x_m, y_m, rows, cols)
+            changed[n_changed,0] = x_m
+            changed[n_changed,1] = y_m
+            n_changed += 1
+    return applied
+
+
+@njit(cache=True, fastmath=True, nogil=True)
+def simulate(surface, N, dN, K, check, low, high, k_minus, k_plus, k_nm, rows, cols):
+    """Run N interactions on [surface] keeping the neighbours as state between the interactions,
+    the surface is stored every dN interactions in a (N//dN + 1, L, L) array. For K > 1 the
+    interactions are drawn in batches of K by interaction_batch, a dropped interaction does not
+    count towards N. Every [check] interactions an OverflowError is raised when a height lies
+    outside [low, high]."""
+    neigh = nearest_neighbours(surface, rows, cols)
+    counts, sites, position = build_sites(neigh)
+
+    N_surface = np.empty((N//dN + 1, surface.shape[0], surface.shape[1]), dtype=surface.dtype)
+    N_surface[0] = surface
+    t = 0
+    next_check = check
+    while t < N:
+        if K == 1:
+            step(surface, neigh, counts, sites, position, k_minus, k_plus, k_nm, rows, cols)
+            t_next = t + 1
+        else:
+            t_next = t + interaction_batch(surface, neigh, counts, sites, position, min(K, N-t),
+                                           k_minus, k_plus, k_nm, rows, cols)
+        for i in range(t//dN + 1, t_next//dN + 1):
+            N_surface[i] = surface
+        if t_next >= next_check:
+            if surface.max() > high or surface.min() < low:
+                raise OverflowError("surface height is about to overflow the surface dtype")
+            next_check = t_next + check
+        t = t_next
+    return N_surface
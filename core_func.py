@@ -1,13 +1,17 @@
 from gettext import find
 import numpy as np
 import matplotlib.pyplot as plt
-from random import uniform, choice
+from multiprocessing import Pool, cpu_count
+from multiprocessing.pool import ThreadPool
+from functools import partial, lru_cache
+import _kernels
 """global parameters"""
 kb = 1.380649e-23
 
 
 class Simulation:
-    """ Wrapping object for the saved simulations
+    """ Wrapping object for the saved simulations, the saved (L, L, steps) array is stored as
+    (steps, L, L) in self.data so every surface is one contiguous block
     """
     def __init__(self, file_string):
 
@@ -25,7 +29,41 @@ class Simulation:
         parameters['steps'] = steps
         parameters['L'] = L
         self.parameters = parameters
-        self.data = data
+        self.data = np.ascontiguousarray(data.transpose(2,0,1))
+
+
+class RNGBuffer:
+    """ Buffered random number generator, the random numbers are drawn in blocks from a numpy
+    Generator instead of one python call per number
+
+    Parameter
+    ---------
+    seed : int, optional
+        Seed of the generator
+    size : int
+        Number of random numbers drawn at once
+    """
+    def __init__(self, seed=None, size=65536):
+        self.rng = np.random.default_rng(seed)
+        self.size = size
+        self.buffer = self.rng.random(size)
+        self.index = 0
+
+    def next_uniform(self):
+        """Returns a uniform random number in [0, 1)"""
+        if self.index == self.size:
+            self.buffer = self.rng.random(self.size)
+            self.index = 0
+        rand = self.buffer[self.index]
+        self.index += 1
+        return rand
+
+    def next_int(self, n):
+        """Returns a random integer in [0, n)"""
+        return int(self.next_uniform()*n)
+
+
+_rng = RNGBuffer()
 
 
 def init_crystal(dims):
@@ -40,9 +78,10 @@ def init_crystal(dims):
     Return
     ------
     surface : nd.array
-        The occupied crystal latticle points
+        The occupied crystal latticle points, the heights are stored as int16 which allows
+        heights up to 32767
     """
-    surface = np.ones(dims)
+    surface = np.ones(dims, dtype=np.int16)
     return surface
 
 
@@ -61,18 +100,9 @@ def nearest_neighbours(surface):
         An N x N matrix representing the number of neighbouring spaces of location (i, j)
         of the crystal surface that are occupied by an atom
     """
-    dims = surface.shape
-    neighbours = np.ones(dims)
-    for i in range(dims[0]):
-        for j in range(dims[1]):
-            if surface[i,j] <= surface[int(i+1-dims[0]*np.floor((i+1)/dims[0])),j]:
-                neighbours[i,j] += 1
-            if surface[i,j] <= surface[i,int(j+1-dims[1]*np.floor((j+1)/dims[1]))]:
-                neighbours[i,j] += 1
-            if surface[i,j] <= surface[int(i-1-dims[0]*np.floor((i-1)/dims[0])),j]:
-                neighbours[i,j] += 1
-            if surface[i,j] <= surface[i,int(j-1-dims[1]*np.floor((j-1)/dims[1]))]:
-                neighbours[i,j] += 1
+    rows, cols = _kernels.periodic_indices(surface.shape)
+    neighbours = np.empty(surface.shape)
+    _kernels.count_neighbours(surface, neighbours, rows, cols)
     return neighbours
 
 
@@ -149,6 +179,36 @@ def surface_migration_rate(n, m, T):
     return k_nm
 
 
+@lru_cache(maxsize=32)
+def build_rate_tables(T, mu):
+    """Precompute the rates for a simulation, T and mu are constant during a simulation. The
+    tables are cached on (T, mu) and returned read-only, so repeated calls are free.
+
+    Parameter
+    ---------
+    T : float
+        Dimensionless temperature
+    mu : float
+        Dimensionless chemical potential
+
+    Return
+    ------
+    k_minus : nd.array
+        Evaporation rate where k_minus[n-1] belongs to an atom with n neighbours
+    k_plus : float
+        Dimensionless impingement rate
+    k_nm : nd.array
+        5 x 5 matrix of migration rates where k_nm[n-1, m-1] is the rate from n to m neighbours
+    """
+    n = np.arange(1, 6)
+    k_minus = evaporation_rate(n, T)
+    k_plus = float(impingement_rate(mu, T))
+    k_nm = np.array([[surface_migration_rate(i, j, T) for j in n] for i in n])
+    k_minus.flags.writeable = False
+    k_nm.flags.writeable = False
+    return k_minus, k_plus, k_nm
+
+
 def choose_subset(surface, T, mu):
     """choose the number of neighbours each atom in the subset will have in which interaction will occur
 
@@ -163,78 +223,156 @@ def choose_subset(surface, T, mu):
 
     Return
     ------
-    subset :
-
+    subset : int
+        The number of neighbours all the atoms in the subset have
     """
-    counts = dict(zip([1, 2, 3, 4, 5], [0, 0, 0, 0, 0]))
-    neigh = nearest_neighbours(surface)
-    unique, counting = np.unique(neigh, return_counts = True)
-    index = 0
-    for number in unique:
-        counts[number] = counting[index]
-        index += 1
-
-    denom = 0
-    for i in range(1,6):
-        denom += counts[i]*(evaporation_rate(i,T)+impingement_rate(mu, T)+surface_migration_rate(i,i,T))
-
-    prob = np.zeros(5)
-    for i in range(5):
-        prob[i] = counts[i+1]*(evaporation_rate(i+1,T)+impingement_rate(mu, T)+surface_migration_rate(i+1,i+1,T))/denom
-
-    rand = uniform(0,1)
-    if rand < prob[0]:
-        subset = 1
-    elif rand < prob[0] + prob[1]:
-        subset = 2
-    elif rand < prob[0] + prob[1] + prob[2]:
-        subset = 3
-    elif rand < prob[0] + prob[1] + prob[2] + prob[3]:
-        subset = 4
-    elif rand < prob[0] + prob[1] + prob[2] + +prob[3] + prob[4]:
-        subset = 5
-
-    return subset
+    rows, cols = _kernels.periodic_indices(surface.shape)
+    neigh = _kernels.nearest_neighbours(surface, rows, cols)
+    subset = _kernels.choose_subset(neigh, *build_rate_tables(T, mu))
+    return int(subset)
 
 
 def interaction(surface, T, mu):
-    """randomly lets interaction take place in chosen subset"""
+    """randomly lets interaction take place in chosen subset
 
-    dims = surface.shape
-    neigh = nearest_neighbours(surface)
-    subset = choose_subset(surface, T, mu)
-    options_x = np.where(neigh==subset)[0]
-    options_y = np.where(neigh==subset)[1]
-    site = choice(range(np.size(options_x)))
+    Parameter
+    ---------
+    surface : nd.array
+        An N x N matrix representing the surface of a crystal, it is changed in place
+    T : float
+        Dimensionless temperature
+    mu : float
+        Dimensionless chemical potential
 
-    location = (options_x[site], options_y[site])
+    Return
+    ------
+    surface : nd.array
+        The crystal surface after the interaction, an OverflowError is raised instead when a
+        height is at the limit of the surface dtype
+    """
+    low, high = _kernels.height_limits(surface)
+    if surface.max() >= high or surface.min() <= low:
+        raise OverflowError("surface height is about to overflow the surface dtype")
+    rows, cols = _kernels.periodic_indices(surface.shape)
+    return _kernels.interaction(surface, *build_rate_tables(T, mu), rows, cols)
 
-    k_plus = impingement_rate(mu, T)
-    k_minus = evaporation_rate(subset, T)
-    k_nn = surface_migration_rate(subset, subset, T)
 
-    denom = k_plus + k_minus + k_nn
+def simulate(surface, T, mu, N, dN, K=1):
+    """Let N interactions take place on the crystal surface. The number of neighbours is kept
+    between the interactions and only updated around the atoms that changed.
 
-    rand = uniform(0,1)
-    if rand < k_plus/denom:
-        surface[location] += 1
-    elif rand < (k_plus+k_minus)/denom:
-        surface[location] -= 1
-    else:
-        migrate = choice([(1,1),(1,0),(1,-1),(0,1),(0,-1),(-1,1),(-1,0),(-1,-1)])
-        m = neigh[int(location[0]+migrate[0]-dims[0]*np.floor((location[0]+migrate[0])/dims[0])),
-                  int(location[1]+migrate[1]-dims[1]*np.floor((location[1]+migrate[1])/dims[1]))]
-        n = neigh[location]
-        prob = surface_migration_rate(n, m, T)
-        rand = uniform(0,1)
-        if rand < prob:
-            surface[location] -= 1
-            surface[int(location[0]+migrate[0]-dims[0]*np.floor((location[0]+migrate[0])/dims[0])),
-                  int(location[1]+migrate[1]-dims[1]*np.floor((location[1]+migrate[1])/dims[1]))] += 1
+    Parameter
+    ---------
+    surface : nd.array
+        An N x N matrix representing the surface of a crystal, it is changed in place
+    T : float
+        Dimensionless temperature
+    mu : float
+        Dimensionless chemical potential
+    N : int
+        The number of interactions
+    dN : int
+        The number of interactions between subsequent stored crystal surfaces
+    K : int
+        The number of interactions drawn at once, for K > 1 interactions that lie too close to
+        an earlier interaction in the same batch are dropped. This approximates one interaction
+        at a time with an error that grows with K/L^2, so K may be at most L^2/256
 
+    Return
+    ------
+    N_surface : nd.array
+        The crystal surface at every dN interactions, starting with the initial surface, with
+        shape (N//dN + 1, L, L) so N_surface[i] is the surface after i*dN interactions. The
+        (L, L, steps) layout of saved runs is N_surface.transpose(1, 2, 0)
+
+    For an integer surface, like the int16 one of init_crystal, the heights are checked at
+    least every quarter of the dtype maximum interactions and an OverflowError is raised before a
+    height can wrap around, for int16 this limits the heights to about 24000.
+    """
+    if K < 1:
+        raise ValueError("K must be at least 1")
+    if K > 1 and K*256 > surface.shape[0]*surface.shape[1]:
+        raise ValueError(f"K must be at most {surface.shape[0]*surface.shape[1]//256} for a "
+                         f"{surface.shape[0]} x {surface.shape[1]} surface")
+    low, high = _kernels.height_limits(surface)
+    check = min(int(dN), int(high)//4)
+    if K >= int(high)//4:
+        raise ValueError(f"K must be smaller than {int(high)//4} for a {surface.dtype} surface")
+    low, high = low + check + K, high - check - K
+    rows, cols = _kernels.periodic_indices(surface.shape)
+    return _kernels.simulate(surface, int(N), int(dN), int(K), check, low, high,
+                             *build_rate_tables(T, mu), rows, cols)
+
+
+def make_step_fn(dims, T, mu):
+    """Compile an interaction step specialised for one simulation. The rate tables and the
+    periodic index tables are baked into the compiled function as constants, so they no longer
+    have to be passed and looked up as arguments. Every call compiles a new function, so make it
+    once per simulation.
 
-    return surface
+    Parameter
+    ---------
+    dims : Tulple or nd.array
+        The dimensions of the crystal surface
+    T : float
+        Dimensionless temperature
+    mu : float
+        Dimensionless chemical potential
 
+    Return
+    ------
+    step : function
+        step(surface, neigh, counts, sites, position, n) lets n interactions take place and
+        updates the state in place, the state is made with init_state. A ValueError is
+        raised when the surface or neighbours do not have the dimensions [dims]. For an integer
+        surface the heights are checked every min(n, dtype maximum/4) interactions and an
+        OverflowError is raised before a height can wrap around, this check costs a pass over
+        the surface so prefer a large n over many calls with a small n
+    """
+    k_minus, k_plus, k_nm = build_rate_tables(T, mu)
+    rows, cols = _kernels.periodic_indices(dims)
+    kernel_step = _kernels.step
+    height_limits = _kernels.height_limits
+    L0, L1 = int(dims[0]), int(dims[1])
+
+    @_kernels.njit(fastmath=True, nogil=True)
+    def step(surface, neigh, counts, sites, position, n=1):
+        if (surface.shape[0] != L0 or surface.shape[1] != L1
+                or neigh.shape[0] != L0 or neigh.shape[1] != L1):
+            raise ValueError("surface does not have the dimensions the step was made for")
+        low, high = height_limits(surface)
+        check = max(min(n, int(high)//4), 1)
+        for t in range(n):
+            if t % check == 0 and (surface.max() > high - check or surface.min() < low + check):
+                raise OverflowError("surface height is about to overflow the surface dtype")
+            kernel_step(surface, neigh, counts, sites, position, k_minus, k_plus, k_nm, rows, cols)
+
+    return step
+
+
+def init_state(surface):
+    """Create the state used by the step function from make_step_fn
+
+    Parameter
+    ---------
+    surface : nd.array
+        An N x N matrix representing the surface of a crystal
+
+    Return
+    ------
+    neigh : nd.array
+        The number of neighbours of every atom
+    counts : nd.array
+        counts[n] is the number of atoms with n neighbours
+    sites : nd.array
+        sites[n, :counts[n]] are the flat indices of the atoms with n neighbours
+    position : nd.array
+        position[k] is where the atom with flat index k is stored in its row of [sites]
+    """
+    rows, cols = _kernels.periodic_indices(surface.shape)
+    neigh = _kernels.nearest_neighbours(surface, rows, cols)
+    counts, sites, position = _kernels.build_sites(neigh)
+    return neigh, counts, sites, position
 
 
 def dislocation_matrices(dims, face, face_loc, boundaries, b):
@@ -273,8 +411,8 @@ def dislocation_matrices(dims, face, face_loc, boundaries, b):
     backward_matrix : nd.array
         Matrix used to create dislocation when looking at the backward neighbour
     """
-    forward_matrix = np.zeros(dims)
-    backward_matrix = np.zeros(dims)
+    forward_matrix = np.zeros(dims, dtype=np.int16)
+    backward_matrix = np.zeros(dims, dtype=np.int16)
     line = np.arange(boundaries[0], boundaries[1], 1, dtype=int)
     dislocation_line = np.ones(boundaries[1]-boundaries[0])*b
     if face == 0:
@@ -284,12 +422,43 @@ def dislocation_matrices(dims, face, face_loc, boundaries, b):
         forward_matrix[line, face_loc] = dislocation_line
         backward_matrix[line, face_loc-1] = -dislocation_line
     else:
-        raise ValueWarning('Value for [face] should be either 0 or 1')
+        raise ValueError('Value for [face] should be either 0 or 1')
 
     return forward_matrix, backward_matrix
 
 
-def dislocation_neighbours(surface, face, forward_matrix, backward_matrix):
+def dislocation_offsets(face, forward_matrix, backward_matrix):
+    """The dislocation as an offset on the height of the four neighbours of every surface atom.
+    The offsets are constant during a simulation and only have to be made once.
+
+    Parameter
+    ---------
+    face : int --> {0, 1}
+        The plain the dislocation line is located in
+    forward_matrix : nd.array
+        Matrix used to create dislocation when looking at the forward neighbour
+    backward_matrix : nd.array
+        Matrix used to create dislocation when looking at the backward neighbour
+
+    Return
+    ------
+    offsets : nd.array
+        A 4 x N x N array with the offset on the height of the neighbours at (i+1, j),
+        (i-1, j), (i, j+1) and (i, j-1) of location (i, j)
+    """
+    offsets = np.zeros((4,) + forward_matrix.shape, dtype=forward_matrix.dtype)
+    if face == 0:
+        offsets[0] = np.roll(forward_matrix, -1, axis=0)
+        offsets[1] = np.roll(backward_matrix, 1, axis=0)
+    elif face == 1:
+        offsets[2] = np.roll(forward_matrix, -1, axis=1)
+        offsets[3] = np.roll(backward_matrix, 1, axis=1)
+    else:
+        raise ValueError('Value for the face of the dislocation should be either 0 for (010) plane or 1 for the (100) plane')
+    return offsets
+
+
+def dislocation_neighbours(surface, face, forward_matrix, backward_matrix, offsets=None):
     """Identifying the number of neighbours of each surface atom using periodic boundary
     conditions for a surface with a single dislocation.
 
@@ -307,6 +476,8 @@ def dislocation_neighbours(surface, face, forward_matrix, backward_matrix):
         Matrix used to create dislocation when looking at the forward neighbour
     backward_matrix : nd.array
         Matrix used to create dislocation when looking at the backward neighbour
+    offsets : nd.array, optional
+        The offsets from dislocation_offsets, made from the matrices when not given
 
     Return
     ------
@@ -314,34 +485,12 @@ def dislocation_neighbours(surface, face, forward_matrix, backward_matrix):
         An N x N matrix representing the number of neighbouring spaces of location (i, j)
         of the crystal surface that are occupied by an atom
     """
-    neighbours = np.ones(dims)
-    forward_neighbour = surface + forward_matrix
-    backward_neighbour = surface + backward_matrix
+    if offsets is None:
+        offsets = dislocation_offsets(face, forward_matrix, backward_matrix)
 
-    if face == 0:
-        for i in range(dims[0]):
-            for j in range(dims[1]):
-                if surface[i,j] <= forward_neighbour[int(i+1-dims[0]*np.floor((i+1)/dims[0])),j]:
-                    neighbours[i,j] += 1
-                if surface[i,j] <= surface[i,int(j+1-dims[1]*np.floor((j+1)/dims[1]))]:
-                    neighbours[i,j] += 1
-                if surface[i,j] <= backward_neighbour[int(i-1-dims[0]*np.floor((i-1)/dims[0])),j]:
-                    neighbours[i,j] += 1
-                if surface[i,j] <= surface[i,int(j-1-dims[1]*np.floor((j-1)/dims[1]))]:
-                    neighbours[i,j] += 1
-    elif face == 1:
-        for i in range(dims[0]):
-            for j in range(dims[1]):
-                if surface[i,j] <= surface[int(i+1-dims[0]*np.floor((i+1)/dims[0])),j]:
-                    neighbours[i,j] += 1
-                if surface[i,j] <= forward_neighbour[i,int(j+1-dims[1]*np.floor((j+1)/dims[1]))]:
-                    neighbours[i,j] += 1
-                if surface[i,j] <= surface[int(i-1-dims[0]*np.floor((i-1)/dims[0])),j]:
-                    neighbours[i,j] += 1
-                if surface[i,j] <= backward_neighbour[i,int(j-1-dims[1]*np.floor((j-1)/dims[1]))]:
-                    neighbours[i,j] += 1
-    else:
-        raise ValueWarning('Value for the face of the dislocation should be either 0 for (010) plane or 1 for the (100) plane')
+    rows, cols = _kernels.periodic_indices(surface.shape)
+    neighbours = np.empty(surface.shape)
+    _kernels.count_dislocation_neighbours(surface, offsets, neighbours, rows, cols)
     return neighbours
 
 
@@ -378,27 +527,31 @@ def nm_migration_rate(loc_n, loc_m, surface, neighbours, T, face, forward_matrix
         Dimensionless migration rate
     """
 
-    n = neighbours(loc)
+    dims = surface.shape
+    n = neighbours[loc_n]
     surface[loc_n] += -1
     surface[loc_m] += 1
+    forward_neighbour = surface + forward_matrix
+    backward_neighbour = surface + backward_matrix
+    i, j = loc_m
     m = 1
     if face == 0:
-        if surface[loc_m] <= forward_neighbour[int(loc_m[0]+1-dims[0]*np.floor((loc_m[0]+1)/dims[0])),loc_m[1]]:
+        if surface[loc_m] <= forward_neighbour[(i+1) % dims[0],j]:
             m += 1
-        if surface[loc_m] <= surface[loc_m[0],int(loc_m[1]+1-dims[1]*np.floor((loc_m[1]+1)/dims[1]))]:
+        if surface[loc_m] <= surface[i,(j+1) % dims[1]]:
             m += 1
-        if surface[loc_m] <= backward_neighbour[int(loc_m[0]-1-dims[0]*np.floor((loc_m[0]-1)/dims[0])),loc_m[1]]:
+        if surface[loc_m] <= backward_neighbour[(i-1) % dims[0],j]:
             m += 1
-        if surface[loc_m] <= surface[loc_m[0],int(loc_m[1]-1-dims[1]*np.floor((loc_m[1]-1)/dims[1]))]:
+        if surface[loc_m] <= surface[i,(j-1) % dims[1]]:
             m += 1
     else:
-        if surface[loc_m] <= surface[int(loc_m[0]+1-dims[0]*np.floor((loc_m[0]+1)/dims[0])),loc_m[1]]:
+        if surface[loc_m] <= surface[(i+1) % dims[0],j]:
             m += 1
-        if surface[loc_m] <= forward_neighbour[loc_m[0],int(loc_m[1]+1-dims[1]*np.floor((loc_m[1]+1)/dims[1]))]:
+        if surface[loc_m] <= forward_neighbour[i,(j+1) % dims[1]]:
             m += 1
-        if surface[loc_m] <= surface[int(loc_m[0]-1-dims[0]*np.floor((loc_m[0]-1)/dims[0])),loc_m[1]]:
+        if surface[loc_m] <= surface[(i-1) % dims[0],j]:
             m += 1
-        if surface[loc_m] <= backward_neighbour[loc_m[0],int(loc_m[1]-1-dims[1]*np.floor((loc_m[1]-1)/dims[1]))]:
+        if surface[loc_m] <= backward_neighbour[i,(j-1) % dims[1]]:
             m += 1
 
     if n == 1 or m == 1:
@@ -417,7 +570,7 @@ def nm_migration_rate(loc_n, loc_m, surface, neighbours, T, face, forward_matrix
     return k_nm
 
 
-def dis_choose_subset(surface, T, mu, face, f_matrix, b_matrix):
+def dis_choose_subset(surface, T, mu, face, f_matrix, b_matrix, offsets=None, rng=None):
     """choose the number of neighbours each atom in the subset will have in which interaction will occur
 
     Parameter
@@ -428,44 +581,37 @@ def dis_choose_subset(surface, T, mu, face, f_matrix, b_matrix):
         Dimensionless temperature
     mu : float
         Dimensionless chemical potential
+    face : int --> {0, 1}
+        The plain the dislocation line is located in
+    f_matrix : nd.array
+        Matrix used to create dislocation when looking at the forward neighbour
+    b_matrix : nd.array
+        Matrix used to create dislocation when looking at the backward neighbour
+    offsets : nd.array, optional
+        The offsets from dislocation_offsets, pass them to avoid remaking them every call
+    rng : RNGBuffer, optional
+        The random number generator to draw from, pass a seeded one for a reproducible draw.
+        By default a shared unseeded generator is used
 
     Return
     ------
-    subset :
-
+    subset : int
+        The number of neighbours all the atoms in the subset have
     """
-    counts = dict(zip([1, 2, 3, 4, 5], [0, 0, 0, 0, 0]))
-    neigh = dislocation_neighbours(surface, face, f_matrix, b_matrix)
-    unique, counting = np.unique(neigh, return_counts = True)
-    index = 0
-    for number in unique:
-        counts[number] = counting[index]
-        index += 1
-
-    denom = 0
-    for i in range(1,6):
-        denom += counts[i]*(evaporation_rate(i,T)+impingement_rate(mu, T)+surface_migration_rate(i,i,T))
-
-    prob = np.zeros(5)
-    for i in range(5):
-        prob[i] = counts[i+1]*(evaporation_rate(i+1,T)+impingement_rate(mu, T)+surface_migration_rate(i+1,i+1,T))/denom
-
-    rand = uniform(0,1)
-    if rand < prob[0]:
-        subset = 1
-    elif rand < prob[0] + prob[1]:
-        subset = 2
-    elif rand < prob[0] + prob[1] + prob[2]:
-        subset = 3
-    elif rand < prob[0] + prob[1] + prob[2] + prob[3]:
-        subset = 4
-    elif rand < prob[0] + prob[1] + prob[2] + +prob[3] + prob[4]:
-        subset = 5
+    neigh = dislocation_neighbours(surface, face, f_matrix, b_matrix, offsets)
+    counts = np.bincount(neigh.ravel().astype(np.int64), minlength=6)[1:6]
 
+    k_minus, k_plus, k_nm = build_rate_tables(T, mu)
+    cdf = np.cumsum(counts*(k_minus + k_plus + np.diag(k_nm)))
+
+    if rng is None:
+        rng = _rng
+    rand = rng.next_uniform()*cdf[-1]
+    subset = min(int(np.searchsorted(cdf, rand, side='right')), 4) + 1
     return subset
 
 
-def find_avg_height(plane: np.ndarray) -> list[float,float]:
+def find_avg_height(plane: np.ndarray) -> tuple[float, float]:
     """Finds the average height and standard deviation of the height of the plane
 
     Parameters
@@ -475,12 +621,12 @@ def find_avg_height(plane: np.ndarray) -> list[float,float]:
 
     Returns
     -------
-    List[float,float]
-        list of average height and standard deviation
+    tuple[float, float]
+        average height and standard deviation
     """
 
-    average_height = np.average(plane)
-    deviation_height = np.std(plane)
+    average_height = plane.mean()
+    deviation_height = np.sqrt(np.mean((plane - average_height)**2))
 
     return average_height, deviation_height
 
@@ -489,7 +635,7 @@ def find_rate(initial_state: np.ndarray,
     final_state: np.ndarray,
     initial_iter: int,
     final_iter: int
-    ) -> list[float, float]:
+    ) -> tuple[float, float]:
     """Finds the rate of growth of the crystal phase in units of k+
 
     Parameters
@@ -505,7 +651,7 @@ def find_rate(initial_state: np.ndarray,
 
     Returns
     -------
-    list[float, float]
+    tuple[float, float]
         rate and error thereof
     """
 
@@ -519,7 +665,7 @@ def find_rate(initial_state: np.ndarray,
     return rate, error
 
 
-def compute_rates(simulation: Simulation) -> list[np.ndarray,np.ndarray]:
+def compute_rates(simulation: Simulation) -> tuple[np.ndarray, np.ndarray]:
     """ Computes the growth rate over a whole simulation and error by using error propagation
 
     Parameters
@@ -529,7 +675,7 @@ def compute_rates(simulation: Simulation) -> list[np.ndarray,np.ndarray]:
 
     Returns
     -------
-    list[np.ndarray,np.ndarray]
+    tuple[np.ndarray, np.ndarray]
         array of rates and errors thereof
     """
 
@@ -545,20 +691,88 @@ def compute_rates(simulation: Simulation) -> list[np.ndarray,np.ndarray]:
 
     iter_int = tot_steps / int_surf_amnt
 
-    rates = np.array([], dtype=np.float64)
-    rates_err = np.array([], dtype=np.float64)
-
-    for i in range(int_surf_amnt-1):
-        start = i*iter_int
-        stop = (i+1)*iter_int
+    planes = data_arr[:int_surf_amnt]
+    heights = planes.mean(axis=(1,2))
+    deviations = planes.std(axis=(1,2))
 
-
-        rate, err = find_rate(data_arr[:,:,i], data_arr[:,:,i+1], start, stop)
-        rates = np.append(rates, rate)
-        rates_err = np.append(rates_err, err)
+    rates = np.diff(heights) / iter_int
+    rates_err = np.sqrt(deviations[:-1]**2 + deviations[1:]**2) / iter_int
 
     kplus = np.exp(mu)*evaporation_rate(3, temp)
     rates = rates * atoms
     rates_err = rates_err /kplus /atoms
 
-    return rates, rates_err
\ No newline at end of file
+    return rates, rates_err
+
+
+def _single_run(seed: int, params: dict) -> dict:
+    """Runs a single replica of a simulation in a worker process
+
+    Parameters
+    ----------
+    seed : int
+        seed for the random number generators of this replica
+    params : dict
+        simulation parameters with keys 'dims', 'T', 'mu', 'N', 'dN' and optionally 'K'
+
+    Returns
+    -------
+    dict
+        the seed, the average height at every stored surface and the growth rate and error
+        thereof over the whole run
+    """
+
+    _kernels.seed(seed)
+
+    surface = init_crystal(params['dims'])
+    N_surface = simulate(surface, params['T'], params['mu'], params['N'], params['dN'],
+                         params.get('K', 1))
+    rate, error = find_rate(N_surface[0], surface, 0, params['N'])
+
+    return {'seed': seed,
+            'heights': N_surface.mean(axis=(1,2)),
+            'rate': rate,
+            'rate_err': error}
+
+
+def run_parallel(n_replicas: int,
+    params: dict,
+    processes: int = None,
+    seed: int = None,
+    threads: bool = False
+    ) -> list[dict]:
+    """Runs independent replicas of a simulation in parallel processes, only a summary of
+    every replica is sent back instead of the stored surfaces. The compiled kernels are serial and
+    release the GIL, so every replica keeps one core busy and the replicas can also run in
+    threads of this process. The kernel random state is per thread, so a replica gives the same
+    result in a thread as in a process.
+
+    Parameters
+    ----------
+    n_replicas : int
+        number of replicas
+    params : dict
+        simulation parameters with keys 'dims', 'T', 'mu', 'N', 'dN' and optionally 'K'
+    processes : int, optional
+        number of worker processes, by default the number of cpu's
+    seed : int, optional
+        seed from which the seeds of the replicas are drawn
+    threads : bool
+        If True the replicas run in a thread pool instead of a process pool
+
+    Returns
+    -------
+    list[dict]
+        summaries of the replicas as returned by _single_run, in order of completion
+    """
+
+    seeds = np.random.SeedSequence(seed).generate_state(n_replicas)
+    if processes is None:
+        processes = cpu_count()
+    chunksize = max(1, n_replicas // (4*processes))
+
+    pool_type = ThreadPool if threads else Pool
+    with pool_type(processes) as pool:
+        results = list(pool.imap_unordered(partial(_single_run, params=params),
+                                           [int(i) for i in seeds], chunksize=chunksize))
+    return results
@@ -1,7 +1,7 @@
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib import cm
-from random import uniform, choice
+from core_func import RNGBuffer
 
 
 
@@ -16,9 +16,11 @@ class crystal():
         Dimensionless chemical potential
     T : float
         Dimensionless temperature
+    seed : int, optional
+        Seed of the random number generator of the growth
     """
 
-    def __init__(self, dims, mu, T):
+    def __init__(self, dims, mu, T, seed=None):
         self.T = T
         self.mu = mu
         self.dims = dims
@@ -30,6 +32,7 @@ class crystal():
         self.time = 0
         self.surface = np.ones(self.dims)
         self.surface = self.surface[:,:,np.newaxis]
+        self.rng = RNGBuffer(seed)
 
 
     def dislocation_matrices(self, face, face_loc, boundaries, b):
@@ -75,7 +78,7 @@ class crystal():
             self.fy_matrix += f_matrix
             self.by_matrix += b_matrix
         else:
-            raise ValueWarning('Value for [face] should be either 0 or 1')
+            raise ValueError('Value for [face] should be either 0 or 1')
         self.num_dislocations += 1
         print('crystal surface with {} dislocations'.format(str(self.num_dislocations)))
 
@@ -265,17 +268,9 @@ class crystal():
             prob[i] = counts[i+1] * (self.evaporation_rate(i+1) + impingement_rate
                                      + self.nn_migration_rate(i+1)) / denom
 
-        rand = uniform(0,1)
-        if rand < prob[0]:
-            subset = 1
-        elif rand < prob[0] + prob[1]:
-            subset = 2
-        elif rand < prob[0] + prob[1] + prob[2]:
-            subset = 3
-        elif rand < prob[0] + prob[1] + prob[2] + prob[3]:
-            subset = 4
-        elif rand < prob[0] + prob[1] + prob[2] + +prob[3] + prob[4]:
-            subset = 5
+        cdf = np.cumsum(prob)
+        rand = self.rng.next_uniform()*cdf[-1]
+        subset = min(int(np.searchsorted(cdf, rand, side='right')), 4) + 1
 
         return subset, neigh
 
@@ -289,7 +284,7 @@ class crystal():
         subset, neigh = self.choose_subset()
         options_x = np.where(neigh==subset)[0]
         options_y = np.where(neigh==subset)[1]
-        site = choice(range(np.size(options_x)))
+        site = self.rng.next_int(np.size(options_x))
 
         location = (options_x[site], options_y[site])
 
@@ -299,7 +294,7 @@ class crystal():
 
         denom = k_plus + k_minus + k_nn
         #Speed of the code might be improved if new neighbour matrix is also constructed in this part
-        rand = uniform(0,1)
+        rand = self.rng.next_uniform()
         if rand < k_plus/denom:
             change_surface[location] += 1
             print('impingement')
@@ -309,9 +304,9 @@ class crystal():
         else:
             #Should the choise for migration location depend on k_nm????????????????????????????
             options = [(1,1),(1,0),(1,-1),(0,1),(0,-1),(-1,1),(-1,0),(-1,-1)]
-            migrate = choice(options)
+            migrate = options[self.rng.next_int(len(options))]
             prob = self.nm_migration_rate(location, migrate, neigh)
-            rand = uniform(0,1)
+            rand = self.rng.next_uniform()
             if rand < prob:
                 print('migration')
                 change_surface[location] -= 1
@@ -343,6 +338,8 @@ class grow_crystal():
     set_migration : {True, False}
         If True surface migration is allowed
         If False surface migration is NOT allowed
+    seed : int, optional
+        Seed of the random number generator of the growth
 
     Return
     ------
@@ -356,7 +353,7 @@ class grow_crystal():
         The number of neighbours of all the atoms at the last cycle
     """
 
-    def __init__(self, dims, mu, T, set_migration):
+    def __init__(self, dims, mu, T, set_migration, seed=None):
         self.T = T
         self.mu = mu
         self.dims = dims
@@ -370,6 +367,7 @@ class grow_crystal():
         self.N_surface = self.surface[:,:,np.newaxis]
         self.neigh = np.array([])
         self.set_migration = set_migration
+        self.rng = RNGBuffer(seed)
 
     def dislocation_matrices(self, face, face_loc, boundaries, b):
         """Defining a dislocation line on the (001) cystal surface and create matrices to model
@@ -414,7 +412,7 @@ class grow_crystal():
             self.fy_matrix += f_matrix
             self.by_matrix += b_matrix
         else:
-            raise ValueWarning('Value for [face] should be either 0 or 1')
+            raise ValueError('Value for [face] should be either 0 or 1')
         self.num_dislocations += 1
         print('crystal surface with {} dislocations'.format(str(self.num_dislocations)))
 
@@ -629,17 +627,9 @@ class grow_crystal():
             prob[i] = counts[i+1] * (self.evaporation_rate(i+1) + impingement_rate
                                      + self.nn_migration_rate(i+1)) / denom
 
-        rand = uniform(0,1)
-        if rand < prob[0]:
-            subset = 1
-        elif rand < prob[0] + prob[1]:
-            subset = 2
-        elif rand < prob[0] + prob[1] + prob[2]:
-            subset = 3
-        elif rand < prob[0] + prob[1] + prob[2] + prob[3]:
-            subset = 4
-        elif rand < prob[0] + prob[1] + prob[2] + +prob[3] + prob[4]:
-            subset = 5
+        cdf = np.cumsum(prob)
+        rand = self.rng.next_uniform()*cdf[-1]
+        subset = min(int(np.searchsorted(cdf, rand, side='right')), 4) + 1
 
         return subset
 
@@ -666,7 +656,7 @@ class grow_crystal():
         neigh = self.neigh
         options_x = np.where(neigh==subset)[0]
         options_y = np.where(neigh==subset)[1]
-        site = choice(range(np.size(options_x)))
+        site = self.rng.next_int(np.size(options_x))
 
         location = (options_x[site], options_y[site])
 
@@ -678,7 +668,7 @@ class grow_crystal():
         scan_loc_matrix = [(0,0), (0,-1), (0,1), (-1,0), (1,0)]
         change_neigh = np.zeros(dims)
 
-        rand = uniform(0,1)
+        rand = self.rng.next_uniform()
         if rand < k_plus/denom:
             change_surface[location] += 1
             new_surface = surface + change_surface
@@ -708,9 +698,9 @@ class grow_crystal():
             new_neigh = neigh + change_neigh
         else:
             options = [(1,1),(1,0),(1,-1),(0,1),(0,-1),(-1,1),(-1,0),(-1,-1)]
-            migrate = choice(options)
+            migrate = options[self.rng.next_int(len(options))]
             prob = self.nm_migration_rate(location, migrate, neigh)
-            rand = uniform(0,1)
+            rand = self.rng.next_uniform()
             if rand < prob:
                 change_surface[location] -= 1
                 change_surface[(location[0]+migrate[0]) % dims[0], (location[1]+migrate[1]) % dims[1]] +=1
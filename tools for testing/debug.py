@@ -19,16 +19,14 @@ size_x, size_y, steps = shape
 
 
 iter_interval = iter / steps
-rates = np.array([])
-rates_err = np.array([])
+rates = np.empty(steps-1)
+rates_err = np.empty(steps-1)
 
 for i in range(steps-1):
     start = i*iter_interval
     stop = (i+1)*iter_interval
 
-    rate, err = find_rate(growth_array[:,:,i], growth_array[:,:,i+1], start, stop)
-    rates = np.append(rates, rate)
-    rates_err = np.append(rates_err, err)
+    rates[i], rates_err[i] = find_rate(growth_array[:,:,i], growth_array[:,:,i+1], start, stop)
 
 
 intervals = np.arange(steps-1)*iter_interval